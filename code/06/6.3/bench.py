@@ -0,0 +1,260 @@
+# bench.py
+#
+# Benchmark suite for the portie CSV readers.
+#
+# Synthesises portfolio.csv- and stocklog.csv-shaped files (optionally
+# with a fraction of bad rows, like Data/missing.csv) and measures each
+# reader mode on them: rows/sec, peak RSS growth and memory blocks kept
+# per row.  Every measurement runs in a freshly forked process.  Results
+# are written as JSON and can be compared against a stored baseline.
+#
+# Run from this directory, for example:
+#
+#     python bench.py --sizes 1e3,1e5 --bad 0,0.05 --output base.json
+#     python bench.py --sizes 1e3,1e5 --bad 0,0.05 --baseline base.json
+#
+# Generated files are kept in --datadir and reused between runs.
+
+import argparse
+import collections
+import gc
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+import portie
+from portie import cache, convert, parallel
+
+NAMES = ['AA', 'IBM', 'CAT', 'MSFT', 'GE', 'HPQ', 'KO', 'XOM']
+
+PORTFOLIO_TYPES = [str, str, int, float]
+STOCKLOG_TYPES = [str, float, str, str, float, float, float, float, int]
+
+def make_portfolio(filename, nrows, bad=0.0, seed=42):
+    '''
+    Write a synthetic portfolio.csv-shaped file with nrows holdings.
+    About a fraction bad of them have a missing or invalid share count.
+    '''
+    rand = random.Random(seed)
+    with open(filename, 'w') as f:
+        f.write('name,date,shares,price\n')
+        for n in range(nrows):
+            shares = rand.randint(1, 1000)
+            if bad and rand.random() < bad:
+                shares = rand.choice(['', 'N/A'])
+            f.write('"{}","2007-{:02d}-{:02d}",{},{:.2f}\n'.format(
+                rand.choice(NAMES), rand.randint(1, 12), rand.randint(1, 28),
+                shares, rand.uniform(1, 200)))
+
+def make_stocklog(filename, nrows, bad=0.0, seed=42):
+    '''
+    Write a synthetic stocklog.csv-shaped file (with a header row).
+    About a fraction bad of the rows have an invalid volume.
+    '''
+    rand = random.Random(seed)
+    with open(filename, 'w') as f:
+        f.write('name,price,date,time,change,open,high,low,volume\n')
+        for n in range(nrows):
+            price = rand.uniform(10, 200)
+            volume = rand.randint(1000, 5000000)
+            if bad and rand.random() < bad:
+                volume = 'N/A'
+            f.write('"{}",{:.2f},"6/11/2007","{}:{:02d}am",{:.2f},{:.2f},{:.2f},{:.2f},{}\n'.format(
+                rand.choice(NAMES), price, 9 + n % 3, n % 60, rand.uniform(-2, 2),
+                price, price + 1, price - 1, volume))
+
+SHAPES = { 'portfolio': (make_portfolio, PORTFOLIO_TYPES),
+           'stocklog': (make_stocklog, STOCKLOG_TYPES) }
+
+def _consume(iterator):
+    collections.deque(iterator, maxlen=0)
+
+def _make_cache(filename, types):
+    cache.read_columns(filename, types, errors='silent')
+
+def _portfolio_from_csv(filename, types):
+    # Portfolio.from_csv() from Lesson 10
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '10', '10.4')
+    if path not in sys.path:
+        sys.path.append(path)
+    import holding
+    return holding.Portfolio.from_csv(filename)
+
+# Reader modes.  Each is called as func(filename, types) and returns the
+# loaded data.  Modes in PORTFOLIO_ONLY are skipped for other shapes.
+MODES = {
+    'read_csv':          lambda f, t: portie.read_csv(f, t, errors='silent'),
+    'iter_csv':          lambda f, t: _consume(portie.iter_csv(f, t, errors='silent')),
+    'record=tuple':      lambda f, t: portie.read_csv(f, t, errors='silent', record=tuple),
+    'record=namedtuple': lambda f, t: portie.read_csv(f, t, errors='silent', record='namedtuple'),
+    'record=slots':      lambda f, t: portie.read_csv(f, t, errors='silent', record='slots'),
+    'mapped':            lambda f, t: portie.read_csv(f, t, errors='silent', mapped=True),
+    'select':            lambda f, t: portie.read_csv(f, t, errors='silent', select=['name', 'price']),
+    'where':             lambda f, t: portie.read_csv(f, t, errors='silent', where={'name': 'IBM'}),
+    'intern':            lambda f, t: portie.read_csv(f, t, errors='silent', intern=True),
+    'infer':             lambda f, t: portie.read_csv(f, 'infer', errors='silent'),
+    'collect':           lambda f, t: portie.read_csv(f, t, errors='collect'),
+    'read_columns':      lambda f, t: portie.read_columns(f, t, errors='silent'),
+    'encode':            lambda f, t: portie.read_columns(f, t, errors='silent', encode=['name']),
+    'parallel':          lambda f, t: parallel.read_csv_parallel(f, t, errors='silent'),
+    'parallel_columns':  lambda f, t: parallel.read_columns_parallel(f, t, errors='silent'),
+    'cache_warm':        lambda f, t: cache.read_columns(f, t, errors='silent'),
+    'fixed_price':       lambda f, t: portie.read_portfolio_columns(f, errors='silent', price=convert.cents),
+    'Portfolio.from_csv': _portfolio_from_csv,
+}
+PORTFOLIO_ONLY = { 'fixed_price', 'Portfolio.from_csv' }
+
+# Setup run (untimed) before a mode is measured
+SETUP = { 'cache_warm': _make_cache }
+
+def _measure_child(func, args, queue):
+    try:
+        gc.collect()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        blocks = sys.getallocatedblocks() - blocks
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+        # ru_maxrss is in kilobytes on Linux
+        queue.put({ 'seconds': elapsed, 'rss': rss * 1024, 'blocks': blocks })
+    except Exception as err:
+        queue.put({ 'error': '{}: {}'.format(type(err).__name__, err) })
+
+def measure(func, *args):
+    '''
+    Run func(*args) in a fresh process.  Returns a dict with the elapsed
+    seconds, the growth in peak RSS (bytes) and the number of memory
+    blocks still allocated to the result, or with an error message.
+    '''
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure_child, args=(func, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def data_file(datadir, shape, nrows, bad):
+    '''
+    Return the name of a synthetic data file, making it if needed
+    '''
+    filename = os.path.join(datadir, '{}-{}-{}.csv'.format(shape, nrows, bad))
+    if not os.path.exists(filename):
+        make, _ = SHAPES[shape]
+        make(filename + '.tmp', nrows, bad)
+        os.replace(filename + '.tmp', filename)
+    return filename
+
+def run(sizes, bads, shapes, modes, datadir, repeat=1):
+    '''
+    Run every mode on every file, returning a list of result dicts
+    '''
+    results = []
+    for shape in shapes:
+        types = SHAPES[shape][1]
+        for nrows in sizes:
+            for bad in bads:
+                filename = data_file(datadir, shape, nrows, bad)
+                for mode in modes:
+                    if mode in PORTFOLIO_ONLY and shape != 'portfolio':
+                        continue
+                    if mode in SETUP:
+                        SETUP[mode](filename, types)
+                    runs = [ measure(MODES[mode], filename, types) for _ in range(repeat) ]
+                    entry = { 'mode': mode, 'shape': shape, 'rows': nrows, 'bad': bad }
+                    failed = [ r['error'] for r in runs if 'error' in r ]
+                    if failed:
+                        entry['error'] = failed[0]
+                    else:
+                        seconds = min(r['seconds'] for r in runs)
+                        entry['seconds'] = seconds
+                        entry['rows_per_sec'] = nrows / seconds
+                        entry['peak_rss'] = max(r['rss'] for r in runs)
+                        entry['blocks_per_row'] = min(r['blocks'] for r in runs) / nrows
+                    results.append(entry)
+                    print_entry(entry)
+    return results
+
+def _label(entry):
+    return '{mode:<20s} {shape:<10s} {rows:>9d} bad={bad:<5}'.format(**entry)
+
+def print_entry(entry):
+    if 'error' in entry:
+        print(_label(entry), 'ERROR', entry['error'])
+    else:
+        print(_label(entry), '{:>11.0f} rows/s {:>8.1f} MB RSS {:>6.2f} blocks/row'.format(
+            entry['rows_per_sec'], entry['peak_rss'] / 1e6, entry['blocks_per_row']))
+
+def compare(results, baseline, threshold=0.10):
+    '''
+    Print the change in speed and peak RSS of results relative to
+    baseline.  Returns the entries that got worse by more than threshold.
+    '''
+    def key(entry):
+        return (entry['mode'], entry['shape'], entry['rows'], entry['bad'])
+
+    old = { key(entry): entry for entry in baseline }
+    regressions = []
+    print()
+    print('{:<47s} {:>9s} {:>9s}'.format('Relative to baseline', 'speed', 'RSS'))
+    for entry in results:
+        base = old.get(key(entry))
+        if base is None or 'error' in entry or 'error' in base:
+            continue
+        speed = entry['rows_per_sec'] / base['rows_per_sec']
+        rss = entry['peak_rss'] / base['peak_rss'] if base['peak_rss'] else 1.0
+        flag = ''
+        if speed < 1 - threshold or rss > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(entry)
+        print(_label(entry), '{:>8.2f}x {:>8.2f}x{}'.format(speed, rss, flag))
+    return regressions
+
+def _numbers(text, func=float):
+    return [ func(float(value)) for value in text.split(',') ]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the portie CSV readers')
+    parser.add_argument('--sizes', default='1e3,1e4,1e5',
+                        help='comma separated row counts, e.g. 1e3,1e7')
+    parser.add_argument('--bad', default='0,0.01', help='comma separated bad row fractions')
+    parser.add_argument('--shapes', default=','.join(SHAPES), help='portfolio and/or stocklog')
+    parser.add_argument('--modes', default=','.join(MODES), help='reader modes to run')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per measurement (best kept)')
+    parser.add_argument('--datadir', default='bench-data', help='where generated files are kept')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results saved by --output')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown or RSS growth counted as a regression')
+    args = parser.parse_args(argv)
+
+    modes = args.modes.split(',')
+    shapes = args.shapes.split(',')
+    for name in modes:
+        if name not in MODES:
+            parser.error('unknown mode {!r}'.format(name))
+    for name in shapes:
+        if name not in SHAPES:
+            parser.error('unknown shape {!r}'.format(name))
+
+    os.makedirs(args.datadir, exist_ok=True)
+    results = run(_numbers(args.sizes, int), _numbers(args.bad), shapes, modes,
+                  args.datadir, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({ 'python': sys.version, 'results': results }, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,9 @@
 # __init__.py
 
 # Lifting symbols from submodules up a level
-from .port import read_portfolio
-from .reader import read_csv
-
+from .port import read_portfolio, read_portfolios, read_portfolio_columns, follow_portfolio, total_cost
+from .reader import read_csv, iter_csv, read_columns
+from .parallel import read_csv_parallel, read_columns_parallel
+from .report import ErrorReport
+from .stats import ReadStats
+from .incremental import IncrementalReader
@@ -0,0 +1,69 @@
+# aioreader.py
+#
+# Reading CSV files from asyncio code without blocking the event loop.
+# File I/O and tokenising run in a thread, in large batches of rows.
+# Each batch is converted on the event loop, and control goes back to
+# the loop every few hundred records so other tasks keep running.
+#
+# One csv.reader reads the whole file, so quoted fields with embedded
+# newlines are handled as they are by read_csv().
+
+import asyncio
+import csv
+from itertools import islice
+
+from . import reader
+from .compress import open_text
+from .report import ErrorReport
+
+BATCHSIZE = 4096                # Rows read per batch
+YIELD_EVERY = 500               # Records converted between yields to the loop
+
+def _read_rows(rows, batchsize):
+    # Runs in a thread: read and tokenise the next batchsize rows
+    return list(islice(rows, batchsize))
+
+async def aiter_csv(filename, types, *, errors='warn', batchsize=BATCHSIZE,
+                    yield_every=YIELD_EVERY, **options):
+    '''
+    Asynchronously read a CSV file with type conversion, producing one
+    record at a time.  Use as "async for record in aiter_csv(...)".
+    types, errors and the other options are as for reader.read_csv,
+    except that errors='collect' isn't available (pass an ErrorReport).
+    '''
+    reader._check_errors(errors, collect=False)
+    reader._record_kind(options.get('record', dict))
+    types, widen = await asyncio.to_thread(reader._resolve_types, filename, types)
+
+    f = await asyncio.to_thread(open_text, filename)
+    try:
+        rows = csv.reader(f)
+        headers = await asyncio.to_thread(next, rows, None)
+        if headers is None:
+            raise reader._no_header(filename)
+        rowno = 1
+        count = 0
+        while True:
+            batch = await asyncio.to_thread(_read_rows, rows, batchsize)
+            if not batch:
+                break
+            for record in reader.convert_rows(batch, headers, types, errors=errors,
+                                              start=rowno, widen=widen, **options):
+                yield record
+                count += 1
+                if count % yield_every == 0:
+                    await asyncio.sleep(0)
+            rowno += len(batch)
+    finally:
+        await asyncio.to_thread(f.close)
+
+async def aread_csv(filename, types, *, errors='warn', **options):
+    '''
+    Asynchronously read a CSV file into a list of records.
+    errors='collect' returns a tuple (records, report).
+    '''
+    reader._check_errors(errors)
+    if errors == 'collect':
+        report = ErrorReport()
+        return await aread_csv(filename, types, errors=report, **options), report
+    return [ record async for record in aiter_csv(filename, types, errors=errors, **options) ]
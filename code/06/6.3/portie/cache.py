@@ -0,0 +1,188 @@
+# cache.py
+#
+# Opt-in binary cache for parsed CSV columns.  The first load of a file
+# parses it with reader.read_columns() and saves the typed columns in a
+# sidecar file next to it.  Later loads memory-map the sidecar instead
+# of parsing the CSV again.
+#
+# Sidecar layout:
+#
+#     magic        8 bytes   b'PORTIE\x00\x01'
+#     metalen      8 bytes   length of the JSON metadata (little-endian)
+#     metadata     metalen bytes of JSON, padded to a multiple of 8
+#     columns      one block per column, each padded to a multiple of 8
+#
+# int and float columns are stored as raw array('q') / array('d') data
+# in native byte order.  They are copied straight from the mapped file
+# into array objects, so a cached load gives the same column types as a
+# parse.
+# str columns are stored as UTF-8 joined by NUL characters.
+#
+# The metadata records the path, size and mtime of the CSV file plus the
+# types used to parse it.  If any of those don't match, or the sidecar
+# can't be read, the CSV file is simply parsed again.
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from . import reader
+from .report import collecting
+
+MAGIC = b'PORTIE\x00\x01'
+_header = struct.Struct('<8sQ')
+
+def _pad(n):
+    return (n + 7) & ~7
+
+def _type_name(func):
+    return '{}.{}'.format(func.__module__, func.__qualname__)
+
+def _column_kind(func):
+    if func is str:
+        return 'str'
+    return reader._typecode(func)
+
+def _make_key(filename, types):
+    st = os.stat(filename)
+    return { 'path': os.path.abspath(filename),
+             'size': st.st_size,
+             'mtime_ns': st.st_mtime_ns,
+             'byteorder': sys.byteorder,
+             'types': [ _type_name(func) for func in types ] }
+
+class _BadRows(object):
+    '''
+    Collects bad rows during a cold parse so they can be replayed later
+    '''
+    def __init__(self, errors):
+        self.errors = errors
+        self.rows = []
+
+    def __call__(self, rowno, row, err):
+        self.rows.append((rowno, row, str(err)))
+        reader._bad_row(self.errors, rowno, row, err)
+
+def _replay(errors, badrows):
+    for rowno, row, reason in badrows:
+        reader._bad_row(errors, rowno, row, ValueError(reason))
+
+def write_cache(cachefile, key, columns, badrows=()):
+    '''
+    Write parsed columns to cachefile.  Returns False if the columns
+    can't be cached (unsupported column types or NUL characters in text).
+    '''
+    blocks = []
+    meta = { 'key': key, 'columns': [], 'badrows': list(badrows) }
+    nrows = None
+    for name, column in columns.items():
+        if isinstance(column, list):
+            if any('\x00' in value for value in column):
+                return False
+            data = '\x00'.join(column).encode('utf-8')
+            kind = 'str'
+        else:
+            data = column.tobytes()
+            kind = column.typecode
+        nrows = len(column)
+        meta['columns'].append({ 'name': name, 'kind': kind, 'nbytes': len(data) })
+        blocks.append(data)
+    meta['nrows'] = nrows or 0
+
+    metadata = json.dumps(meta).encode('utf-8')
+    tmpname = '{}.{}.tmp'.format(cachefile, os.getpid())
+    with open(tmpname, 'wb') as f:
+        f.write(_header.pack(MAGIC, len(metadata)))
+        f.write(metadata.ljust(_pad(len(metadata)), b'\x00'))
+        for data in blocks:
+            f.write(data.ljust(_pad(len(data)), b'\x00'))
+    os.replace(tmpname, cachefile)
+    return True
+
+def load_cache(cachefile, key):
+    '''
+    Load columns from cachefile.  Returns (columns, badrows) or None if the
+    cache is missing, stale or corrupt.
+    '''
+    try:
+        with open(cachefile, 'rb') as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        return _load_columns(m, key)
+    except (ValueError, KeyError, TypeError, IndexError, struct.error):
+        return None
+    finally:
+        m.close()
+
+def _load_columns(m, key):
+    magic, metalen = _header.unpack_from(m, 0)
+    if magic != MAGIC:
+        return None
+    offset = _header.size
+    meta = json.loads(m[offset:offset+metalen].decode('utf-8'))
+    if meta['key'] != key:
+        return None
+    offset += _pad(metalen)
+    nrows = meta['nrows']
+    columns = { }
+    with memoryview(m) as view:
+        for info in meta['columns']:
+            nbytes = info['nbytes']
+            if offset + nbytes > len(m):
+                return None
+            with view[offset:offset+nbytes] as data:
+                if info['kind'] == 'str':
+                    column = str(data, 'utf-8').split('\x00') if nrows else []
+                else:
+                    column = array(info['kind'])
+                    column.frombytes(data)
+            if len(column) != nrows:
+                return None
+            columns[info['name']] = column
+            offset += _pad(nbytes)
+    return columns, meta['badrows']
+
+def _project(columns, select):
+    if select is None:
+        return columns
+    if isinstance(select, str):
+        select = [ select ]
+    for name in select:
+        if name not in columns:
+            raise ValueError('Unknown column {!r} in select'.format(name))
+    return { name: columns[name] for name in select }
+
+@collecting
+def read_columns(filename, types, *, errors='warn', cachefile=None, mapped=False, select=None):
+    '''
+    Like reader.read_columns(), but cached in a binary sidecar file
+    (filename + '.pcache' unless cachefile is given).  Only int, float
+    and str columns can be cached; other types are always parsed.  The
+    cache always holds every column; select just picks from it.
+    '''
+    reader._check_errors(errors)
+    if not all(_column_kind(func) for func in types):
+        return reader.read_columns(filename, types, errors=errors, mapped=mapped, select=select)
+
+    if cachefile is None:
+        cachefile = filename + '.pcache'
+    key = _make_key(filename, types)
+    cached = load_cache(cachefile, key)
+    if cached is not None:
+        columns, badrows = cached
+        _replay(errors, badrows)
+        return _project(columns, select)
+
+    badrows = _BadRows(errors)
+    columns = reader.read_columns(filename, types, errors=badrows, mapped=mapped)
+    try:
+        write_cache(cachefile, key, columns, badrows.rows)
+    except OSError:
+        pass        # Cache is best effort (e.g., read-only directory)
+    return _project(columns, select)
@@ -0,0 +1,41 @@
+# compress.py
+#
+# Transparent reading of gzip, bz2 and xz compressed files.  The format
+# is detected from the first few bytes of the file, not its name.
+
+import bz2
+import gzip
+import io
+import lzma
+
+BUFSIZE = 1024 * 1024           # Decompressed bytes handed to the parser at a time
+
+_formats = [
+    (b'\x1f\x8b', 'gzip', gzip.open),
+    (b'BZh', 'bz2', bz2.open),
+    (b'\xfd7zXZ\x00', 'xz', lzma.open),
+]
+
+def _detect(filename):
+    with open(filename, 'rb') as f:
+        head = f.read(6)
+    for magic, name, opener in _formats:
+        if head.startswith(magic):
+            return name, opener
+    return None, None
+
+def compression(filename):
+    '''
+    Return 'gzip', 'bz2' or 'xz' for a compressed file, None otherwise
+    '''
+    return _detect(filename)[0]
+
+def open_text(filename):
+    '''
+    Open a file for reading text, decompressing it on the fly if it is
+    gzip, bz2 or xz compressed.
+    '''
+    name, opener = _detect(filename)
+    if opener is None:
+        return open(filename, 'r')
+    return io.TextIOWrapper(io.BufferedReader(opener(filename, 'rb'), BUFSIZE))
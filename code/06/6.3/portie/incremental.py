@@ -0,0 +1,105 @@
+# incremental.py
+#
+# Re-reading a CSV file that only ever grows at the end.  The reader
+# remembers how far it got (a checkpoint of byte offset, row count and
+# header) and each call to read() parses only the rows appended since.
+# If the file was truncated or replaced, it starts again from the top.
+
+import csv
+import io
+import os
+
+from . import reader
+from .compress import compression
+
+class IncrementalReader(object):
+    '''
+    Reads the rows appended to filename since the last call to read().
+    types and the keyword options are as for reader.read_csv().  Pass a
+    saved checkpoint (see the checkpoint attribute) to carry on from an
+    earlier run.
+    '''
+    def __init__(self, filename, types, *, errors='warn', checkpoint=None, **options):
+        reader._check_errors(errors, collect=False)
+        reader._record_kind(options.get('record', dict))
+        if compression(filename):
+            raise ValueError("Can't read compressed files incrementally")
+        self.filename = filename
+        self.types = types
+        self.errors = errors
+        self.options = options
+        self.reloaded = False
+        self._reset()
+        if checkpoint and checkpoint['header'] is not None:
+            # A checkpoint taken before the header was read is a fresh start
+            self.offset = checkpoint['offset']
+            self.rowno = checkpoint['rowno']
+            self.header = checkpoint['header'].encode('utf-8')
+            self.ident = tuple(checkpoint['ident'])
+            self._start()
+
+    def _reset(self):
+        self.offset = 0         # Byte offset of the first unread row
+        self.rowno = 0          # Number of data rows read so far
+        self.header = None      # Raw header line
+        self.ident = None       # (st_dev, st_ino) of the file
+        self.headers = None
+        self._types = None
+        self._widen = False
+
+    def _start(self):
+        self.headers = next(csv.reader(io.TextIOWrapper(io.BytesIO(self.header))))
+        self._types, self._widen = reader._resolve_types(self.filename, self.types)
+
+    @property
+    def checkpoint(self):
+        return { 'offset': self.offset,
+                 'rowno': self.rowno,
+                 'header': self.header.decode('utf-8') if self.header else None,
+                 'ident': self.ident }
+
+    def _unchanged(self, f, st):
+        # True if the file still looks like the one we've been reading
+        if (st.st_dev, st.st_ino) != self.ident or st.st_size < self.offset:
+            return False
+        if f.read(len(self.header)) != self.header:
+            return False
+        f.seek(self.offset - 1)
+        return f.read(1) == b'\n'
+
+    def read(self):
+        '''
+        Return a list of the records appended since the last call.  If the
+        file was truncated or replaced, all of its records are returned
+        and the reloaded attribute is set to True.
+        '''
+        self.reloaded = False
+        with open(self.filename, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if self.header is not None and not self._unchanged(f, st):
+                self._reset()
+                self.reloaded = True
+
+            if self.header is None:
+                f.seek(0)
+                header = f.readline()
+                if not header.endswith(b'\n'):
+                    return []           # Header not completely written yet
+                self.header = header
+                self.offset = len(header)
+                self.ident = (st.st_dev, st.st_ino)
+                self._start()
+
+            f.seek(self.offset)
+            data = f.read()
+
+        # Only parse complete lines.  A partly written last line is left
+        # for the next call.
+        end = data.rfind(b'\n') + 1
+        rows = list(csv.reader(io.TextIOWrapper(io.BytesIO(data[:end]))))
+        records = list(reader.convert_rows(rows, self.headers, self._types, errors=self.errors,
+                                           start=self.rowno + 1, widen=self._widen,
+                                           **self.options))
+        self.offset += end
+        self.rowno += len(rows)
+        return records
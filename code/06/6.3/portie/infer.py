@@ -0,0 +1,133 @@
+# infer.py
+#
+# Guess the column types of a CSV file from a sample of its rows.
+# Each column gets the narrowest converter from LADDER that accepts
+# every sampled value.  Missing values (see NA_VALUES) don't count
+# towards the choice, and a column with nothing but missing values is
+# left as str.
+
+import csv
+import io
+import os
+
+from .compress import compression, open_text
+
+LADDER = [ int, float, str ]
+
+# Values that mean "missing".  They never widen a column; rows that have
+# them in a numeric column are bad rows, as with a hand-written schema.
+NA_VALUES = { '', 'NA', 'N/A', 'n/a', 'null', 'NULL', 'None', '-' }
+
+def _accepts(func, values):
+    try:
+        for value in values:
+            func(value)
+    except ValueError:
+        return False
+    return True
+
+def narrowest(values):
+    '''
+    Return the narrowest converter in LADDER that accepts all values.
+    Returns str if every value is missing.
+    '''
+    values = [ value for value in values if value not in NA_VALUES ]
+    if not values:
+        return str
+    for func in LADDER:
+        if _accepts(func, values):
+            return func
+    return str
+
+def sample_rows(filename, *, head=1000, strides=100):
+    '''
+    Return (headers, rows) with the first head rows of a file, plus one
+    row from each of strides evenly spaced positions further on.  Only
+    the first rows are used for compressed files, which can't be seeked.
+    '''
+    with open_text(filename) as f:
+        rows = csv.reader(f)
+        headers = next(rows, None)
+        if headers is None:
+            raise ValueError('{} has no header row'.format(filename))
+        sample = [ row for _, row in zip(range(head), rows) ]
+        more = next(rows, None)
+    if more is None:
+        return headers, sample      # Whole file was read
+
+    sample.append(more)
+    if compression(filename):
+        return headers, sample
+
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        for n in range(1, strides + 1):
+            f.seek(size * n // (strides + 1))
+            f.readline()            # Skip the partial line
+            line = f.readline()
+            if line:
+                sample.extend(csv.reader(io.TextIOWrapper(io.BytesIO(line))))
+    return headers, sample
+
+def infer_types(filename, *, head=1000, strides=100):
+    '''
+    Guess a list of types for the columns of a CSV file
+    '''
+    headers, rows = sample_rows(filename, head=head, strides=strides)
+    return [ narrowest(row[n] for row in rows if n < len(row))
+             for n in range(len(headers)) ]
+
+def widen_types(types, indices, row):
+    '''
+    Called when row fails to convert.  Widen the converters in the types
+    list (in place) for the columns in indices that reject their value.
+    Returns False, leaving types unchanged, if that isn't possible.
+    '''
+    changes = { }
+    for n in indices:
+        if n >= len(row):
+            return False
+        func = types[n]
+        try:
+            func(row[n])
+            continue
+        except ValueError:
+            pass
+        if row[n] in NA_VALUES or func not in LADDER:
+            return False
+        for wider in LADDER[LADDER.index(func)+1:]:
+            if _accepts(wider, [ row[n] ]):
+                changes[n] = wider
+                break
+        else:
+            return False
+    for n, func in changes.items():
+        types[n] = func
+    return bool(changes)
+
+if __name__ == '__main__':
+    # Widening keeps the text of the file.  read_columns() rereads it,
+    # read_csv() only widens the rows from the one that needed it.
+    # A column with only missing values is str, not a column of bad rows.
+    import tempfile
+    from . import reader
+    assert narrowest(['', 'NA']) is str and narrowest(['', '1']) is int
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write('name,price\n' + 'AA,32.20\n' * 20000 + 'BB,abc\nCC,007\n')
+    try:
+        columns = reader.read_columns(f.name, 'infer')
+        assert columns['price'][:1] == ['32.20'] and columns['price'][-2:] == ['abc', '007']
+        records = reader.read_csv(f.name, 'infer')
+        assert records[0]['price'] == 32.2 and [ r['price'] for r in records[-2:] ] == ['abc', '007']
+    finally:
+        os.remove(f.name)
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write('name,notes,shares\n' + 'AA,,10\n' * 50)
+    try:
+        records = reader.read_csv(f.name, 'infer')
+        assert len(records) == 50 and records[0]['notes'] == '' and records[0]['shares'] == 10
+        columns = reader.read_columns(f.name, 'infer')
+        assert columns['notes'] == [''] * 50 and list(columns['shares']) == [10] * 50
+    finally:
+        os.remove(f.name)
+    print('ok')
@@ -0,0 +1,137 @@
+# parallel.py
+#
+# Parse a large CSV file in parallel by splitting it into byte ranges
+# that are aligned to line boundaries.  Each range is parsed by a worker
+# process and the results are merged back together in file order.
+#
+# Note: the split is made on newlines, so files with quoted fields
+# containing embedded newlines can't be read this way.
+#
+# Compressed files can't be split, so they are read serially.
+#
+# As with any use of ProcessPoolExecutor, the calling script needs an
+# "if __name__ == '__main__':" guard.
+
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import reader
+from .infer import infer_types
+from .compress import compression
+from .report import collecting
+
+CHUNKSIZE = 16 * 1024 * 1024
+
+def _read_headers(filename):
+    '''
+    Return the header row and the byte offset of the first data row
+    '''
+    with open(filename, 'rb') as f:
+        line = f.readline()
+        offset = f.tell()
+    headers = next(csv.reader(io.TextIOWrapper(io.BytesIO(line))), None)
+    if headers is None:
+        raise reader._no_header(filename)
+    return headers, offset
+
+def chunk_ranges(filename, start, chunksize=CHUNKSIZE):
+    '''
+    Split a file from byte offset start into (start, end) ranges of
+    roughly chunksize bytes.  Every range begins at the start of a line.
+    '''
+    size = os.path.getsize(filename)
+    ranges = []
+    with open(filename, 'rb') as f:
+        while start < size:
+            f.seek(start + chunksize - 1)
+            f.readline()            # Advance to the start of the next line
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def _parse_chunk(filename, start, end, headers, types, kind):
+    '''
+    Worker: parse the rows in filename[start:end].  Returns a tuple
+    (result, nrows, bad) where bad is a list of (rowno, row, error)
+    with row numbers relative to the start of the chunk.
+    '''
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    rows = csv.reader(io.TextIOWrapper(io.BytesIO(data)))
+    convert = reader._make_converter(tuple(headers), tuple(types), kind)
+    if kind == 'tuple':
+        result = [ reader._make_column(func) for func in types ]
+        appends = [ column.append for column in result ]
+    else:
+        result = []
+    bad = []
+    rowno = 0
+    for rowno, row in enumerate(rows, start=1):
+        try:
+            if kind == 'tuple' and len(row) != len(types):
+                raise ValueError('Expected {} fields, got {}'.format(len(types), len(row)))
+            try:
+                record = convert(row)
+            except IndexError:
+                record = dict(zip(headers, [ func(val) for func, val in zip(types, row) ]))
+        except ValueError as err:
+            bad.append((rowno, row, err))
+            continue
+        if kind == 'tuple':
+            for append, val in zip(appends, record):
+                append(val)
+        else:
+            result.append(record)
+    return result, rowno, bad
+
+def _parse_parallel(filename, headers, start, types, errors, workers, chunksize, kind):
+    ranges = chunk_ranges(filename, start, chunksize)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [ pool.submit(_parse_chunk, filename, start, end, headers, types, kind)
+                    for start, end in ranges ]
+        offset = 0
+        for future in futures:
+            result, nrows, bad = future.result()
+            for rowno, row, err in bad:
+                reader._bad_row(errors, offset + rowno, row, err)
+            offset += nrows
+            yield result
+
+@collecting
+def read_csv_parallel(filename, types, *, errors='warn', workers=None, chunksize=CHUNKSIZE):
+    '''
+    Read a CSV file with type conversion into a list of dicts, parsing
+    chunks of the file in a pool of worker processes.
+    '''
+    reader._check_errors(errors)
+    if compression(filename):
+        return reader.read_csv(filename, types, errors=errors)
+    if types == 'infer':
+        types = infer_types(filename)   # No widening across workers
+    headers, start = _read_headers(filename)
+    records = []
+    for chunk in _parse_parallel(filename, headers, start, types, errors, workers, chunksize, 'dict'):
+        records.extend(chunk)
+    return records
+
+@collecting
+def read_columns_parallel(filename, types, *, errors='warn', workers=None, chunksize=CHUNKSIZE):
+    '''
+    Parallel version of reader.read_columns().  Columns come back from
+    the workers as arrays, which are much cheaper to transfer than dicts.
+    '''
+    reader._check_errors(errors)
+    if compression(filename):
+        return reader.read_columns(filename, types, errors=errors)
+    if types == 'infer':
+        types = infer_types(filename)   # No widening across workers
+    headers, start = _read_headers(filename)
+    columns = [ reader._make_column(func) for func in types ]
+    for chunk in _parse_parallel(filename, headers, start, types, errors, workers, chunksize, 'tuple'):
+        for column, part in zip(columns, chunk):
+            column.extend(part)
+    return dict(zip(headers, columns))
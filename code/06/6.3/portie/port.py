@@ -1,15 +1,130 @@
 # port.py
 
 from . import reader
+from . import cache
+from . import convert
+from .incremental import IncrementalReader
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+import csv
+import glob
+import operator
 
-def read_portfolio(filename, *, errors='warn'):
+def read_portfolio(filename, *, errors='warn', price=float, **options):
     '''
     Read a CSV file with name, date, shares, price data into a list.
+    price is the conversion for prices, e.g. convert.cents for exact
+    integer cents.  Other options (lazy, mapped, record, select, where)
+    are passed on to reader.read_csv().
     '''
-    return reader.read_csv(filename, [str, str, int, float], errors=errors)
+    return reader.read_csv(filename, [str, str, int, price], errors=errors, **options)
+
+def read_portfolio_columns(filename, *, errors='warn', price=float, cached=False, **options):
+    '''
+    Read a CSV file with name, date, shares, price data into columns.
+    If cached is true, use the binary parse cache (see cache.py).
+    Other options are passed on to reader.read_columns().
+    '''
+    if cached:
+        return cache.read_columns(filename, [str, str, int, price], errors=errors, **options)
+    return reader.read_columns(filename, [str, str, int, price], errors=errors, **options)
+
+def _expand_paths(paths):
+    if isinstance(paths, str):
+        if glob.has_magic(paths):
+            return sorted(glob.glob(paths))
+        return [ paths ]
+    return list(paths)
+
+def _file_errors(filename, errors):
+    # Row errors from concurrent files are labelled with the file name
+    if errors != 'warn':
+        return errors
+    def warn(rowno, row, err):
+        print('File:', filename, 'Row:', rowno, 'Bad row:', row)
+        print('File:', filename, 'Row:', rowno, 'Reason:', err)
+    return warn
+
+def _load_portfolio(filename, errors, options):
+    # Runs in a worker thread or process.  Unless errors is 'silent' or
+    # 'raise', bad rows are sent back with the holdings and reported by
+    # the caller, so errors functions needn't be thread safe or picklable.
+    bad = []
+    if errors is None:
+        errors = lambda rowno, row, err: bad.append((rowno, row, err))
+    return read_portfolio(filename, errors=errors, **options), bad
+
+def read_portfolios(paths, *, workers=4, executor=ThreadPoolExecutor, errors='warn',
+                    failed=None, **options):
+    '''
+    Read many portfolio files concurrently with a pool of workers.
+    paths is a list of filenames or a glob pattern such as 'Data/portfolio*.csv'.
+    Produces (filename, holding) pairs as each file finishes loading.
+
+    executor is the pool class.  Threads overlap file I/O, but parsing
+    holds the GIL; use ProcessPoolExecutor to parse on several cores.
+    With processes, records are pickled back to the caller, so record
+    must be dict or tuple, and the calling script needs an
+    "if __name__ == '__main__':" guard.
+
+    A file that can't be read (or, with errors='raise', has a bad row)
+    doesn't stop the others.  Its exception is stored in the failed dict
+    if one is given, and printed if errors='warn'.  lazy isn't
+    supported: each file is read completely by its worker.
+    '''
+    reader._check_errors(errors, collect=False)
+    if options.get('lazy'):
+        raise ValueError('read_portfolios() reads each file in a worker and can\'t be lazy')
+    if issubclass(executor, ProcessPoolExecutor) and options.get('record', dict) not in { dict, tuple }:
+        raise ValueError('record must be dict or tuple with a ProcessPoolExecutor')
+    worker_errors = errors if errors in { 'silent', 'raise' } else None
+    paths = _expand_paths(paths)
+    with executor(max_workers=workers) as pool:
+        pending = { }
+        while paths or pending:
+            # Keep at most 2*workers files in flight to bound memory use
+            while paths and len(pending) < 2 * workers:
+                filename = paths.pop(0)
+                future = pool.submit(_load_portfolio, filename, worker_errors, options)
+                pending[future] = filename
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename = pending.pop(future)
+                try:
+                    holdings, bad = future.result()
+                except (OSError, ValueError, csv.Error) as err:
+                    if failed is not None:
+                        failed[filename] = err
+                    if errors == 'warn':
+                        print('File:', filename, 'Reason:', err)
+                    continue
+                file_errors = _file_errors(filename, errors)
+                for rowno, row, err in bad:
+                    reader._bad_row(file_errors, rowno, row, err)
+                for holding in holdings:
+                    yield filename, holding
+
+def follow_portfolio(filename, *, errors='warn', **options):
+    '''
+    Return an IncrementalReader for a growing portfolio file.  Each call
+    to its read() method returns just the holdings added since the last.
+    '''
+    return IncrementalReader(filename, [str, str, int, float], errors=errors, **options)
+
+def total_cost(columns):
+    '''
+    Compute the total cost (shares*price) of a columnar portfolio.  With
+    fixed-point prices the result is an exact integer in the same units.
+    '''
+    return sum(map(operator.mul, columns['shares'], columns['price']))
+
+def holding_cost(holding):
+    '''
+    Cost of a single holding record (dict) as shares*price
+    '''
+    return holding['shares'] * holding['price']
 
 if __name__ == '__main__':
-    portfolio = read_portfolio('../../Data/portfolio.csv')
+    portfolio = read_portfolio('../../Data/portfolio.csv', lazy=True)
 
     total = 0.0
     for holding in portfolio:
@@ -17,3 +132,8 @@ if __name__ == '__main__':
 
     print('Total cost:', total)
 
+    columns = read_portfolio_columns('../../Data/portfolio.csv')
+    print('Total cost:', total_cost(columns))
+
+    columns = read_portfolio_columns('../../Data/portfolio.csv', price=convert.cents)
+    print('Total cost:', convert.format_fixed(total_cost(columns)))
@@ -1,30 +1,490 @@
 # reader.py
 
 import csv
+import io
+import mmap
+import os
+import sys
+from array import array
+from collections import namedtuple
+from collections.abc import Iterable
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import chain
+from time import perf_counter
 
-def read_csv(filename, types, *, errors='warn'):
+from .report import collecting
+from .compress import compression, open_text
+from .infer import infer_types, widen_types
+
+def _check_errors(errors, collect=True):
+    # errors may also be a function called as errors(rowno, row, err),
+    # such as an ErrorReport.  'collect' is handled by @collecting, so
+    # callers without it pass collect=False to leave it out of the message.
+    if not callable(errors) and errors not in { 'warn', 'silent', 'raise' }:
+        if collect:
+            raise ValueError("errors must be one of 'warn', 'silent', 'raise', 'collect' or a function")
+        raise ValueError("errors must be one of 'warn', 'silent', 'raise' or a function "
+                         "such as an ErrorReport")
+
+def _bad_row(errors, rowno, row, err):
+    if callable(errors):
+        errors(rowno, row, err)
+    elif errors == 'warn':
+        print('Row:', rowno, 'Bad row:', row)
+        print('Row:', rowno, 'Reason:', err)
+    elif errors == 'raise':
+        raise err
+    else:
+        pass     # Ignore
+
+# Record kinds accepted by the record= option
+_record_kinds = { dict: 'dict', tuple: 'tuple', 'namedtuple': 'namedtuple', 'slots': 'slots' }
+
+def _record_kind(record):
+    try:
+        return _record_kinds[record]
+    except (KeyError, TypeError):
+        raise ValueError("record must be one of dict, tuple, 'namedtuple', 'slots'") from None
+
+@lru_cache(maxsize=64)
+def make_record_class(headers, kind='namedtuple'):
     '''
-    Read a CSV file with type conversion into a list of dicts
+    Make a compact record class with one attribute per header.  kind is
+    'namedtuple' or 'slots' (a plain class using __slots__).
     '''
-    if errors not in { 'warn', 'silent', 'raise' }:
-        raise ValueError("errors must be one of 'warn', 'silent', 'raise'")
+    # Let namedtuple check the headers and rename any invalid ones
+    fields = namedtuple('Record', headers, rename=True)._fields
+    if kind == 'namedtuple':
+        return namedtuple('Record', fields)
 
-    records = []
-    with open(filename, 'r') as f:
-        rows = csv.reader(f)
-        headers = next(rows)   # Skip the header row
-        for rowno, row in enumerate(rows, start=1):
+    args = ', '.join(fields)
+    source = 'class Record(object):\n'
+    source += '    __slots__ = _fields = {!r}\n'.format(fields)
+    source += '    def __init__(self, {}):\n'.format(args)
+    for name in fields:
+        source += '        self.{0} = {0}\n'.format(name)
+    source += '    def __repr__(self):\n'
+    source += '        return {!r}.format({})\n'.format(
+        'Record(' + ', '.join('{}={{!r}}'.format(name) for name in fields) + ')',
+        ', '.join('self.' + name for name in fields))
+    source += '    def __eq__(self, other):\n'
+    source += '        if type(other) is not type(self):\n'
+    source += '            return NotImplemented\n'
+    source += '        return ({0},) == ({1},)\n'.format(
+        ', '.join('self.' + name for name in fields),
+        ', '.join('other.' + name for name in fields))
+    env = { }
+    exec(source, env)
+    return env['Record']
+
+def _column_indices(headers, names, option):
+    '''
+    Turn a list of column names into a tuple of column indices
+    '''
+    if isinstance(names, str):
+        names = [ names ]
+    indices = []
+    for name in names:
+        if name not in headers:
+            raise ValueError('Unknown column {!r} in {}'.format(name, option))
+        indices.append(headers.index(name))
+    return tuple(indices)
+
+def _select_indices(headers, select):
+    if select is None:
+        return None
+    return _column_indices(headers, select, 'select')
+
+def _intern_indices(headers, types, intern):
+    # intern=True means every str column
+    if not intern:
+        return None
+    if intern is True:
+        return frozenset(n for n, func in enumerate(types) if func is str)
+    indices = _column_indices(headers, intern, 'intern')
+    if any(n >= len(types) or types[n] is not str for n in indices):
+        raise ValueError('Can only intern str columns')
+    return frozenset(indices)
+
+@lru_cache(maxsize=64)
+def _make_converter(headers, types, kind='dict', indices=None, interned=None):
+    '''
+    Generate a function that converts one raw row into a record, with
+    the per-column conversions unrolled.  kind is 'dict', 'tuple',
+    'namedtuple' or 'slots'.  If indices is given, only those columns
+    are converted.  Values in the interned columns are passed through
+    sys.intern().  Generated functions are cached per signature.
+    '''
+    if indices is None:
+        indices = range(min(len(headers), len(types)))
+    env = { '_intern': sys.intern }
+    names = []
+    exprs = []
+    for n in indices:
+        env['_t{}'.format(n)] = types[n]
+        names.append(headers[n])
+        if interned and n in interned:
+            exprs.append('_intern(_t{0}(row[{0}]))'.format(n))
+        else:
+            exprs.append('_t{0}(row[{0}])'.format(n))
+    names = tuple(names)
+    if kind == 'dict':
+        body = '{' + ', '.join('{!r}: {}'.format(name, expr)
+                               for name, expr in zip(names, exprs)) + '}'
+    elif kind == 'tuple':
+        body = '(' + ''.join(expr + ', ' for expr in exprs) + ')'
+    elif kind == 'namedtuple':
+        env['_R'] = make_record_class(names, kind)
+        env['_new'] = tuple.__new__
+        body = '_new(_R, (' + ''.join(expr + ', ' for expr in exprs) + '))'
+    else:
+        env['_R'] = make_record_class(names, kind)
+        body = '_R(' + ', '.join(exprs) + ')'
+    source = 'def convert(row):\n    return {}\n'.format(body)
+    exec(source, env)
+    return env['convert']
+
+def _make_filter(headers, where):
+    '''
+    Generate a function that tests the raw (unconverted) fields of a row
+    against a dict of {column: value} or {column: collection of values}.
+    Values that aren't strings are compared as str(value).  Rows too
+    short to have the column never match.
+    '''
+    if where is None or callable(where):
+        return None
+    env = { }
+    tests = []
+    for name, value in where.items():
+        if name not in headers:
+            raise ValueError('Unknown column {!r} in where'.format(name))
+        n = headers.index(name)
+        if isinstance(value, str) or not isinstance(value, Iterable):
+            env['_v{}'.format(n)] = str(value)
+            tests.append('row[{0}] == _v{0}'.format(n))
+        else:
+            env['_v{}'.format(n)] = frozenset(map(str, value))
+            tests.append('row[{0}] in _v{0}'.format(n))
+    if not tests:
+        return None
+    maxindex = max(headers.index(name) for name in where)
+    source = 'def accept(row):\n    return len(row) > {} and {}\n'.format(maxindex, ' and '.join(tests))
+    exec(source, env)
+    return env['accept']
+
+def convert_rows(rows, headers, types, *, errors='warn', start=1, record=dict, select=None,
+                 where=None, intern=None, widen=False):
+    '''
+    Apply type conversion to an iterable of raw rows, yielding records.
+    record, select, where and intern are as for read_csv.  If widen is
+    true, a column whose converter rejects a value is switched to a wider
+    one (see infer.widen_types) rather than making the row bad.  types
+    must then be a list, which is updated in place.  Widening only
+    applies to that row and later ones: records already produced keep
+    the values they were converted to.
+    '''
+    headers = tuple(headers)
+    if not widen:
+        types = list(types)
+    kind = _record_kind(record)
+    selected = indices = _select_indices(headers, select)
+    interned = _intern_indices(headers, types, intern)
+    convert = _make_converter(headers, tuple(types), kind, selected, interned)
+    if indices is None:
+        indices = range(min(len(headers), len(types)))
+    accept = _make_filter(headers, where)
+    check = where if callable(where) else None
+    for rowno, row in enumerate(rows, start=start):
+        if accept and not accept(row):
+            continue
+        try:
             try:
-                row = [ func(val) for func, val in zip(types, row) ]
-            except ValueError as err:   
-                if errors == 'warn':
-                    print('Row:', rowno, 'Bad row:', row)
-                    print('Row:', rowno, 'Reason:', err)
-                elif errors == 'raise':
-                    raise    # Reraises the last exception
-                else:
-                    pass     # Ignore
+                record = convert(row)
+            except IndexError:
+                # Short row. Dicts get whatever fields are present.
+                if kind != 'dict':
+                    raise ValueError('Expected {} fields, got {}'.format(len(types), len(row))) from None
+                record = { headers[n]: types[n](row[n]) for n in indices if n < len(row) }
+        except ValueError as err:
+            if not (widen and widen_types(types, indices, row)):
+                _bad_row(errors, rowno, row, err)
                 continue    # Skips to the next row
-            record = dict(zip(headers, row))
-            records.append(record)
-    return records
+            convert = _make_converter(headers, tuple(types), kind, selected, interned)
+            record = convert(row)
+        if check and not check(record):
+            continue
+        yield record
+
+MAP_BLOCKSIZE = 1024 * 1024
+
+def _mapped_blocks(m, blocksize=MAP_BLOCKSIZE):
+    # Decode a mapped file in large newline-aligned blocks, straight
+    # from the mapped buffer without an intermediate bytes copy
+    size = len(m)
+    start = 0
+    with memoryview(m) as view:
+        while start < size:
+            end = m.find(b'\n', min(start + blocksize, size) - 1)
+            end = size if end < 0 else end + 1
+            # Not str.splitlines(), which also splits on \x0c, \x85, etc.
+            # StringIO splits lines the same way as a text mode file.
+            yield io.StringIO(str(view[start:end], 'utf-8'), newline=None)
+            start = end
+
+@contextmanager
+def open_lines(filename, *, mapped=False):
+    '''
+    Open a file for reading as an iterable of text lines.  Compressed
+    files are decompressed on the fly.  If mapped is true, the file is
+    memory-mapped and decoded in large blocks (ignored for compressed
+    files).
+    '''
+    if not mapped or compression(filename):
+        with open_text(filename) as f:
+            yield f
+        return
+
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield iter(())
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            blocks = _mapped_blocks(m)
+            try:
+                yield chain.from_iterable(blocks)
+            finally:
+                blocks.close()     # Release the buffer before unmapping
+
+def _no_header(filename):
+    return ValueError('{} has no header row'.format(filename))
+
+def _resolve_types(filename, types):
+    # Returns (types, widen)
+    if types == 'infer':
+        return infer_types(filename), True
+    return types, False
+
+def _iter_csv(filename, types, errors, mapped, options):
+    types, widen = _resolve_types(filename, types)
+    with open_lines(filename, mapped=mapped) as lines:
+        rows = csv.reader(lines)
+        headers = next(rows, None)     # Skip the header row
+        if headers is None:
+            raise _no_header(filename)
+        yield from convert_rows(rows, headers, types, errors=errors, widen=widen, **options)
+
+def _iter_csv_timed(filename, types, errors, mapped, options, stats):
+    # Same as _iter_csv, with every stage timed into a stats.ReadStats
+    stats.loads += 1
+    start = perf_counter()
+    types, widen = _resolve_types(filename, types)
+    with open_lines(filename, mapped=mapped) as lines:
+        lines = iter(lines)
+        header = next(lines, None)
+        if header is None:
+            raise _no_header(filename)
+        stats.bytes += len(header.encode('utf-8'))
+        headers = next(csv.reader([ header ]))
+        stats._setup += perf_counter() - start
+        rows = stats._rows(csv.reader(stats._lines(lines)))
+        handler = stats._handler(partial(_bad_row, errors))
+        yield from stats._records(convert_rows(rows, headers, types, errors=handler,
+                                               widen=widen, **options))
+
+@collecting
+def iter_csv(filename, types, *, errors='warn', mapped=False, record=dict, select=None,
+             where=None, intern=None, stats=None):
+    '''
+    Read a CSV file with type conversion, producing one record at a time.
+    The file stays open until the iterator is exhausted or closed.
+    '''
+    _check_errors(errors)
+    _record_kind(record)
+    options = dict(record=record, select=select, where=where, intern=intern)
+    if stats is not None:
+        return _iter_csv_timed(filename, types, errors, mapped, options, stats)
+    return _iter_csv(filename, types, errors, mapped, options)
+
+@collecting
+def read_csv(filename, types, *, errors='warn', lazy=False, mapped=False, record=dict, select=None,
+             where=None, intern=None, stats=None):
+    '''
+    Read a CSV file with type conversion into a list of records.
+    If lazy is true, return an iterator over the records instead.
+    If mapped is true, read the file through a memory map.
+
+    types is a list of conversion functions, one per column, or 'infer'
+    to guess them from a sample of the file (see infer.py).  Inferred
+    columns are widened (int -> float -> str) if a later value doesn't
+    fit, instead of making the row bad.  Records before the widening are
+    left as they were, so a column can then hold, e.g., floats in early
+    records and the strings from the file in later ones.  read_columns()
+    rereads the file instead, if it has to.
+
+    record selects the type of each record: dict (the default), tuple,
+    'namedtuple' or 'slots'.  The last two generate a class from the
+    header row and are much smaller than dicts.
+
+    select is an optional list of column names to keep.  Other columns
+    are never converted or stored.
+
+    where filters the rows.  It is either a dict mapping column names
+    to a string or a collection of strings, tested for equality against
+    the raw field before any conversion, or a function that is called on
+    each converted record and returns True for records to keep.  Other
+    values in the dict are compared as str(value), so {'shares': 100}
+    matches a field of exactly '100'.
+
+    intern is a list of str column names whose values are passed through
+    sys.intern(), or True for every str column.  Repeated values such as
+    stock names then share one string object.
+
+    errors says what to do with rows that fail conversion: 'warn' prints
+    them, 'silent' skips them, 'raise' raises the error.  'collect'
+    returns a tuple (records, report) where report is an ErrorReport
+    (filled in as a lazy iterator is consumed).  errors may also be an
+    ErrorReport, or any function called as errors(rowno, row, err).
+
+    stats is an optional stats.ReadStats that collects the time spent in
+    each stage of the load along with row, byte and error counts.
+    '''
+    records = iter_csv(filename, types, errors=errors, mapped=mapped, record=record,
+                       select=select, where=where, intern=intern, stats=stats)
+    if lazy:
+        return records
+    return list(records)
+
+# Array typecodes used for columns of a given type.  A conversion
+# function can also name its own typecode in a typecode attribute (see
+# convert.fixed).  Anything else is stored in a plain list.
+_typecodes = { int: 'q', float: 'd' }
+
+def _typecode(func):
+    return getattr(func, 'typecode', None) or _typecodes.get(func)
+
+def _make_column(func, values=()):
+    typecode = _typecode(func)
+    if typecode:
+        return array(typecode, values)
+    return [ func(value) for value in values ] if values else []
+
+class EncodedColumn(object):
+    '''
+    A dictionary-encoded column.  Each distinct value is stored once in
+    values and the column itself is an array of small integer codes.
+    '''
+    def __init__(self, values=()):
+        self.codes = array('i')
+        self.values = []
+        self.lookup = { }       # value -> code
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [ self.values[code] for code in self.codes[n] ]
+        return self.values[self.codes[n]]
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def __repr__(self):
+        return 'EncodedColumn(<{} rows, {} distinct values>)'.format(len(self.codes), len(self.values))
+
+class _Restart(Exception):
+    # Raised by _read_columns() when a column has to be read again from
+    # the raw text because it was widened to str (or is encoded)
+    pass
+
+def _read_columns(filename, types, errors, mapped, select, where, intern, encode, widen, bad):
+    # One pass of read_columns().  bad is a set of the numbers of the bad
+    # rows reported so far.  A later pass skips them without reporting
+    # them again.
+    with open_lines(filename, mapped=mapped) as lines:
+        rows = csv.reader(lines)
+        headers = next(rows, None)
+        if headers is None:
+            raise _no_header(filename)
+        headers = tuple(headers)
+        selected = indices = _select_indices(headers, select)
+        interned = _intern_indices(headers, types, intern)
+        encoded = _column_indices(headers, encode, 'encode') if encode else ()
+        convert = _make_converter(headers, tuple(types), 'tuple', selected, interned)
+        if indices is None:
+            indices = range(min(len(headers), len(types)))
+        columns = [ EncodedColumn() if n in encoded else _make_column(types[n])
+                    for n in indices ]
+        appends = [ column.append for column in columns ]
+        accept = _make_filter(headers, where)
+        check = where if callable(where) else None
+        names = [ headers[n] for n in indices ]
+        for rowno, row in enumerate(rows, start=1):
+            if (accept and not accept(row)) or rowno in bad:
+                continue
+            try:
+                if len(row) != len(types):
+                    raise ValueError('Expected {} fields, got {}'.format(len(types), len(row)))
+                values = convert(row)
+            except ValueError as err:
+                before = list(types)
+                if not (widen and widen_types(types, indices, row)):
+                    if widen:
+                        bad.add(rowno)
+                    _bad_row(errors, rowno, row, err)
+                    continue
+                # Rebuild the widened columns with the wider type.  int
+                # values convert to float exactly, but str values have to
+                # be the original text, so that means starting again.
+                for i, n in enumerate(indices):
+                    if types[n] is before[n]:
+                        continue
+                    if len(columns[i]) and (types[n] is str or n in encoded):
+                        raise _Restart()
+                    if n not in encoded:
+                        columns[i] = _make_column(types[n], columns[i])
+                appends = [ column.append for column in columns ]
+                convert = _make_converter(headers, tuple(types), 'tuple', selected, interned)
+                values = convert(row)
+            row = values
+            if check and not check(dict(zip(names, row))):
+                continue
+            for append, val in zip(appends, row):
+                append(val)
+    return { headers[n]: column for n, column in zip(indices, columns) }
+
+@collecting
+def read_columns(filename, types, *, errors='warn', mapped=False, select=None, where=None,
+                 intern=None, encode=None):
+    '''
+    Read a CSV file with type conversion into a dict mapping each header
+    to a column.  int and float columns are stored as array('q') and
+    array('d'), everything else as a list.  select, where and intern
+    are as for read_csv, except that a where function is passed a dict
+    of the selected columns.  encode is a list of column names to store
+    as an EncodedColumn instead.
+
+    With types='infer', a column widened to str (or an encoded column
+    that is widened) makes the file be read again with the wider types,
+    so every value in the column is the text from the file.
+    '''
+    _check_errors(errors)
+    types, widen = _resolve_types(filename, types)
+    types = list(types)
+    bad = set()
+    while True:
+        try:
+            return _read_columns(filename, types, errors, mapped, select, where, intern,
+                                 encode, widen, bad)
+        except _Restart:
+            pass
@@ -0,0 +1,74 @@
+# report.py
+#
+# Collecting bad rows instead of printing them.  An ErrorReport can be
+# passed to any of the readers as errors=, or use errors='collect' to
+# have the reader make one and return it alongside the result.
+
+import csv
+from functools import wraps
+
+class ErrorReport(object):
+    '''
+    Collects bad rows found while reading a file.  At most limit rows
+    are kept in memory (count still counts all of them).  If quarantine
+    is a filename, every bad row is also written there as CSV through a
+    large write buffer.  Call close() (or use a with statement) to flush
+    the quarantine file.
+    '''
+    def __init__(self, limit=1000, quarantine=None, bufsize=1024*1024):
+        self.limit = limit
+        self.quarantine = quarantine
+        self.bufsize = bufsize
+        self.count = 0
+        self.rows = []          # (rowno, row, reason) tuples
+        self._file = None
+        self._writer = None
+
+    def __call__(self, rowno, row, err):
+        self.count += 1
+        if len(self.rows) < self.limit:
+            self.rows.append((rowno, row, str(err)))
+        if self.quarantine is not None:
+            if self._writer is None:
+                self._file = open(self.quarantine, 'w', newline='', buffering=self.bufsize)
+                self._writer = csv.writer(self._file)
+            self._writer.writerow(row)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __repr__(self):
+        return 'ErrorReport(count={}, kept={})'.format(self.count, len(self.rows))
+
+    @property
+    def truncated(self):
+        return self.count > len(self.rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ty, val, tb):
+        self.close()
+
+def collecting(func):
+    '''
+    Decorator for reader functions.  Makes errors='collect' call func with
+    a new ErrorReport and return a tuple (result, report).
+    '''
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if kwargs.get('errors') == 'collect':
+            report = ErrorReport()
+            kwargs['errors'] = report
+            return func(*args, **kwargs), report
+        return func(*args, **kwargs)
+    return wrapper
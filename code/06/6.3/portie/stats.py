@@ -0,0 +1,107 @@
+# stats.py
+#
+# Optional instrumentation for read_csv().  Pass a ReadStats object as
+# stats= to find out where the time of a load goes.  Without stats= the
+# reader runs its normal, untimed loop, so the hook costs nothing.
+#
+# Each stage is timed by wrapping the iterator that feeds the next one.
+# The wrappers record inclusive times; the exclusive time of each stage
+# is worked out when the stats are read.
+
+import json
+from time import perf_counter
+
+class ReadStats(object):
+    '''
+    Cumulative timings and counts for one or more loads.  The stages are:
+
+        setup     opening the file, reading the header, inferring types
+        read      getting lines of text from the file (and decompressing)
+        tokenise  splitting lines into fields with csv.reader
+        convert   type conversion and building records (done together
+                  by one generated function), plus where filtering
+        errors    handling bad rows
+    '''
+    def __init__(self):
+        self.loads = 0
+        self.rows = 0           # Data rows tokenised
+        self.records = 0        # Records produced
+        self.bytes = 0          # UTF-8 bytes read, including headers
+        self.errors = 0         # Bad rows
+        self._setup = 0.0
+        self._read = 0.0        # Inclusive times of the wrapped iterators
+        self._tokenise = 0.0
+        self._convert = 0.0
+        self._errors = 0.0
+
+    @property
+    def times(self):
+        '''
+        Dict mapping each stage to the seconds spent in it
+        '''
+        return { 'setup': self._setup,
+                 'read': self._read,
+                 'tokenise': self._tokenise - self._read,
+                 'convert': self._convert - self._tokenise - self._errors,
+                 'errors': self._errors }
+
+    def as_dict(self):
+        times = self.times
+        return { 'loads': self.loads,
+                 'rows': self.rows,
+                 'records': self.records,
+                 'bytes': self.bytes,
+                 'errors': self.errors,
+                 'times': times,
+                 'total': sum(times.values()) }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def __repr__(self):
+        return 'ReadStats(rows={}, records={}, errors={}, seconds={:.3f})'.format(
+            self.rows, self.records, self.errors, sum(self.times.values()))
+
+    # Wrappers used by the reader
+
+    def _lines(self, lines):
+        lines = iter(lines)
+        while True:
+            start = perf_counter()
+            line = next(lines, None)
+            self._read += perf_counter() - start
+            if line is None:
+                return
+            self.bytes += len(line.encode('utf-8'))
+            yield line
+
+    def _rows(self, rows):
+        while True:
+            start = perf_counter()
+            row = next(rows, None)
+            self._tokenise += perf_counter() - start
+            if row is None:
+                return
+            self.rows += 1
+            yield row
+
+    def _records(self, records):
+        while True:
+            start = perf_counter()
+            record = next(records, None)
+            self._convert += perf_counter() - start
+            if record is None:
+                return
+            self.records += 1
+            yield record
+
+    def _handler(self, handler):
+        # Wrap a bad row handler, called as handler(rowno, row, err)
+        def timed(rowno, row, err):
+            self.errors += 1
+            start = perf_counter()
+            try:
+                handler(rowno, row, err)
+            finally:
+                self._errors += perf_counter() - start
+        return timed
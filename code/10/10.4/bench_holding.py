@@ -0,0 +1,67 @@
+# bench_holding.py
+#
+# Compare the memory use and construction rate of Holding and
+# SlottedHolding.  Run from this directory:  python bench_holding.py [n]
+
+import random
+import sys
+import time
+import tracemalloc
+
+from holding import Holding, SlottedHolding, Portfolio
+
+NAMES = ['AA', 'IBM', 'CAT', 'MSFT', 'GE', 'HPQ', 'KO', 'XOM']
+
+def make_rows(n, seed=42):
+    '''
+    Make n rows of already converted holding data
+    '''
+    rand = random.Random(seed)
+    return [ (rand.choice(NAMES), '2007-06-11', rand.randint(1, 1000), rand.uniform(1, 200))
+             for _ in range(n) ]
+
+def build(holding, rows):
+    return [ holding(name, date, shares, price) for name, date, shares, price in rows ]
+
+def measure(holding, rows):
+    '''
+    Return (holdings/sec, bytes per holding) for building a list of
+    holdings from rows.  The rate is the best of three untraced runs.
+    '''
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        holdings = build(holding, rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del holdings
+    rate = len(rows) / best
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    holdings = build(holding, rows)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # Don't count the list itself or the shared values from rows
+    return rate, (size - sys.getsizeof(holdings)) / len(rows)
+
+def measure_portfolio(holding, rows):
+    '''
+    Return the bytes per holding once the holdings are in a Portfolio
+    '''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    portfolio = Portfolio()
+    portfolio.extend(build(holding, rows))
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size / len(rows)
+
+if __name__ == '__main__':
+    n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1000000
+    rows = make_rows(n)
+    print('{:<16s} {:>14s} {:>14s} {:>16s}'.format('', 'holdings/sec', 'bytes each', 'in Portfolio'))
+    for holding in (Holding, SlottedHolding):
+        rate, size = measure(holding, rows)
+        print('{:<16s} {:>14.0f} {:>14.1f} {:>16.1f}'.format(
+            holding.__name__, rate, size, measure_portfolio(holding, rows)))
@@ -1,12 +1,31 @@
 # holding.py
 
-class Holding(object):
+class BaseHolding(object):
+    '''
+    Behavior shared by Holding and SlottedHolding
+    '''
+    __slots__ = ()
+    _owners = ()                # Weak references to the portfolios holding this
+
     def __init__(self, name, date, shares, price):
+        self._owners = ()
         self.name = name
         self.date = date
         self.shares = shares
         self.price = price
 
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, newname):
+        self._name = newname
+        for ref in self._owners:
+            portfolio = ref()
+            if portfolio is not None:
+                portfolio._renamed(self)
+
     @property
     def price(self):
         return self._price
@@ -17,7 +36,12 @@ class Holding(object):
             raise TypeError('Expected float')
         if newprice < 0:
             raise ValueError('Must >= 0')
-        self._price = newprice
+        if self._owners:
+            oldcost = self.cost
+            self._price = newprice
+            self._cost_changed(oldcost)
+        else:
+            self._price = newprice
 
     @property
     def shares(self):
@@ -27,7 +51,24 @@ class Holding(object):
     def shares(self, newshares):
         if not isinstance(newshares, int):
             raise TypeError('Expected int')
-        self._shares = newshares
+        if self._owners:
+            oldcost = self.cost
+            self._shares = newshares
+            self._cost_changed(oldcost)
+        else:
+            self._shares = newshares
+
+    def _cost_changed(self, oldcost):
+        # Update the running totals of the portfolios holding this
+        change = self.cost - oldcost
+        for ref in self._owners:
+            portfolio = ref()
+            if portfolio is not None:
+                portfolio._total += change
+
+    def __reduce__(self):
+        # Copies and pickles don't belong to any portfolio
+        return (type(self), (self.name, self.date, self.shares, self.price))
 
     def __repr__(self):
         return 'Holding({!r},{!r},{!r},{!r})'.format(self.name, self.date, self.shares, self.price)
@@ -42,49 +83,414 @@ class Holding(object):
     def sell(self, nshares):
         self.shares -= nshares
 
+class Holding(BaseHolding):
+    pass
+
+class SlottedHolding(BaseHolding):
+    '''
+    A Holding without an instance __dict__.  Much smaller, for large
+    portfolios.
+    '''
+    __slots__ = ('_name', 'date', '_shares', '_price', '_owners')
+
 import csv
+import math
+import operator
+import weakref
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def _as_column(values):
+    # Lists and arrays are used as they are, anything else is copied
+    return values if isinstance(values, (list, array)) else list(values)
 
 class Portfolio(object):
-    def __init__(self):
+    '''
+    A list of holdings with an index of holdings by name and a running
+    total cost.  Change the portfolio through its own methods (append,
+    remove, etc.), not by modifying the holdings list directly, so the
+    index and total stay current.  Holdings tell the portfolios they
+    belong to when their shares or price change.  If verify is true,
+    total_cost() checks the running total against a full recompute.
+    '''
+    def __init__(self, verify=False):
         self.holdings = []
+        self._index = { }       # name -> holdings, None if it needs rebuilding
+        self._total = 0         # Running total cost
+        self._owner = (weakref.ref(self),)    # Shared _owners of holdings only here
+        self.verify = verify    # Check the running total in total_cost()
+
+    def __reduce__(self):
+        # Copies hold the same holdings, and must be registered with them
+        return (_make_portfolio, (type(self), self.holdings, self.verify))
 
     def __getattr__(self, name):
         return getattr(self.holdings, name)
 
     @classmethod
-    def from_csv(cls, filename):
+    def from_csv(cls, filename, holding=Holding):
+        '''
+        Read a portfolio from a CSV file.  holding is the class used for
+        each holding (Holding or SlottedHolding).  int() and float()
+        already give shares and prices the right types, so only the
+        price >= 0 rule is checked, and the holdings are made directly
+        instead of through the Holding properties.
+        '''
         self = cls()
+        new = holding.__new__
+        holdings = self.holdings
+        owners = self._owner
+        total = 0
         with open(filename, 'r') as f:
             rows = csv.reader(f)
             headers = next(rows)
             for row in rows:
-                h = Holding(row[0], row[1], int(row[2]), float(row[3]))
-                self.holdings.append(h)
+                nshares = int(row[2])
+                price = float(row[3])
+                if price < 0:
+                    raise ValueError('Must >= 0')
+                h = new(holding)
+                h._owners = owners
+                h._name = row[0]
+                h.date = row[1]
+                h._shares = nshares
+                h._price = price
+                holdings.append(h)
+                total += nshares * price
+        self._index = None
+        self._total = total
+        return self
+
+    @classmethod
+    def from_columns(cls, names, dates, shares, prices, holding=Holding):
+        '''
+        Make a portfolio from columns of names, dates, shares and prices.
+        The columns are checked as a whole (shares must be ints, prices
+        floats >= 0), then the holdings are made directly, without the
+        per-attribute checks of the Holding properties.  holding must be
+        Holding, SlottedHolding or another BaseHolding class.
+        '''
+        names, dates = _as_column(names), _as_column(dates)
+        shares, prices = _as_column(shares), _as_column(prices)
+        if not (len(names) == len(dates) == len(shares) == len(prices)):
+            raise ValueError('Columns must all have the same length')
+        if not all(issubclass(ty, int) for ty in set(map(type, shares))):
+            raise TypeError('Expected int')
+        if not all(issubclass(ty, float) for ty in set(map(type, prices))):
+            raise TypeError('Expected float')
+        if any(price < 0 for price in prices):
+            raise ValueError('Must >= 0')
+
+        self = cls()
+        new = holding.__new__
+        holdings = self.holdings
+        owners = self._owner
+        for name, date, nshares, price in zip(names, dates, shares, prices):
+            h = new(holding)
+            h._owners = owners
+            h._name = name
+            h.date = date
+            h._shares = nshares
+            h._price = price
+            holdings.append(h)
+        self._index = None
+        self._total = sum(map(operator.mul, shares, prices))
         return self
 
+    # Index maintenance.  Appends and removals update the index in place.
+    # Changes that can reorder the holdings, and renamed holdings, just
+    # drop it, and it is rebuilt on the next lookup by name.
+
+    def _names(self):
+        if self._index is None:
+            index = { }
+            for h in self.holdings:
+                index.setdefault(h.name, []).append(h)
+            self._index = index
+        return self._index
+
+    def _added(self, h):
+        h._owners += self._owner
+        self._total += h.cost
+        if self._index is not None:
+            self._index.setdefault(h.name, []).append(h)
+
+    def _disown(self, h):
+        owners = list(h._owners)
+        owners.remove(self._owner[0])
+        h._owners = tuple(owners)
+
+    def _removed(self, h):
+        self._disown(h)
+        self._total -= h.cost
+        if self._index is not None:
+            entries = self._index[h.name]
+            entries.remove(h)
+            if not entries:
+                del self._index[h.name]
+
+    def _renamed(self, h):
+        self._index = None
+
+    def append(self, h):
+        self.holdings.append(h)
+        self._added(h)
+
+    def extend(self, holdings):
+        for h in holdings:
+            self.append(h)
+
+    def __iadd__(self, holdings):
+        self.extend(holdings)
+        return self
+
+    def insert(self, n, h):
+        self.holdings.insert(n, h)
+        self._added(h)
+        self._index = None
+
+    def remove(self, h):
+        self.holdings.remove(h)
+        self._removed(h)
+
+    def pop(self, n=-1):
+        h = self.holdings.pop(n)
+        self._removed(h)
+        return h
+
+    def clear(self):
+        for h in self.holdings:
+            self._disown(h)
+        self.holdings.clear()
+        self._index = { }
+        self._total = 0
+
+    def sort(self, *, key=None, reverse=False):
+        self.holdings.sort(key=key, reverse=reverse)
+        self._index = None
+
+    def reverse(self):
+        self.holdings.reverse()
+        self._index = None
+
     def total_cost(self):
-        return sum([h.shares * h.price for h in self.holdings])
+        if self.verify:
+            expected = sum([h.shares * h.price for h in self.holdings])
+            if not math.isclose(self._total, expected, rel_tol=1e-9, abs_tol=1e-6):
+                raise RuntimeError('Running total {!r} != recomputed total {!r}'.format(self._total, expected))
+        return self._total
+
+    def recompute(self):
+        '''
+        Recompute the running total from scratch, discarding any rounding
+        error built up by many updates.  Returns the new total.
+        '''
+        self._total = sum([h.shares * h.price for h in self.holdings])
+        return self._total
 
     def __len__(self):
         return len(self.holdings)
 
     def __getitem__(self, n):
         if isinstance(n, str):
-            return [ h for h in self.holdings if h.name == n ]
+            return list(self._names().get(n, ()))
         else:
             return self.holdings[n]
 
+    def __setitem__(self, n, value):
+        old = self.holdings[n]
+        if isinstance(n, slice):
+            value = list(value)
+            self.holdings[n] = value
+        else:
+            self.holdings[n] = value
+            old, value = [ old ], [ value ]
+        for h in old:
+            self._removed(h)
+        for h in value:
+            self._added(h)
+        self._index = None
+
+    def __delitem__(self, n):
+        old = self.holdings[n]
+        del self.holdings[n]
+        for h in (old if isinstance(n, slice) else [ old ]):
+            self._removed(h)
+
     def __iter__(self):
         return self.holdings.__iter__()
 
 
-def read_portfolio(filename):
+def _make_portfolio(cls, holdings, verify):
+    portfolio = cls(verify)
+    portfolio.extend(holdings)
+    return portfolio
+
+class HoldingView(BaseHolding):
+    '''
+    A holding that is one row of a ColumnarPortfolio.  Reading or
+    setting an attribute goes straight to the portfolio's columns.
+    '''
+    __slots__ = ('_portfolio', '_n')
+
+    def __init__(self, portfolio, n):
+        self._portfolio = portfolio
+        self._n = n
+
+    def __reduce__(self):
+        return (HoldingView, (self._portfolio, self._n))
+
+    @property
+    def name(self):
+        return self._portfolio.names[self._n]
+
+    @name.setter
+    def name(self, value):
+        self._portfolio.names[self._n] = value
+        self._portfolio._index = None
+
+    @property
+    def date(self):
+        return self._portfolio.dates[self._n]
+
+    @date.setter
+    def date(self, value):
+        self._portfolio.dates[self._n] = value
+
+    @property
+    def _shares(self):
+        return int(self._portfolio.shares[self._n])
+
+    @_shares.setter
+    def _shares(self, value):
+        self._portfolio.shares[self._n] = value
+
+    @property
+    def _price(self):
+        return float(self._portfolio.prices[self._n])
+
+    @_price.setter
+    def _price(self, value):
+        self._portfolio.prices[self._n] = value
+
+_column_types = {
+    # typecode: (Python type, array typecodes, NumPy dtype kinds)
+    'q': (int, 'bBhHiIlLqQ', 'biu'),
+    'd': (float, 'fd', 'f'),
+}
+
+def _column(typecode, values):
+    # NumPy array if NumPy is installed, otherwise an array.array.  The
+    # values are checked the same way as the Holding properties first,
+    # so neither backend silently converts them.
+    kind, typecodes, kinds = _column_types[typecode]
+    if numpy is not None:
+        dtype = { 'q': numpy.int64, 'd': numpy.float64 }[typecode]
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        ok = values.dtype.kind in kinds and numpy.can_cast(values.dtype, dtype)
+    elif isinstance(values, array):
+        ok = values.typecode in typecodes
+    else:
+        values = list(values)
+        ok = all(isinstance(value, kind) for value in values)
+    if not ok:
+        raise TypeError('Expected {}'.format(kind.__name__))
+    if numpy is not None:
+        return numpy.array(values, dtype=dtype)
+    return array(typecode, values)
+
+class ColumnarPortfolio(object):
+    '''
+    A portfolio stored as parallel columns: names and dates are lists,
+    shares and prices are typed arrays (NumPy arrays if available).
+    Indexing and iteration produce HoldingView objects on the rows.
+    '''
+    def __init__(self, names=(), dates=(), shares=(), prices=()):
+        self.names = list(names)
+        self.dates = list(dates)
+        self.shares = _column('q', shares)
+        self.prices = _column('d', prices)
+        if not (len(self.names) == len(self.dates) == len(self.shares) == len(self.prices)):
+            raise ValueError('Columns must all have the same length')
+        if numpy is not None:
+            negative = bool((self.prices < 0).any())
+        else:
+            negative = any(price < 0 for price in self.prices)
+        if negative:
+            raise ValueError('Must >= 0')
+        self._index = None      # name -> row numbers, built on first lookup
+
+    @classmethod
+    def from_csv(cls, filename):
+        names, dates = [], []
+        shares, prices = array('q'), array('d')
+        with open(filename, 'r') as f:
+            rows = csv.reader(f)
+            headers = next(rows)
+            for row in rows:
+                names.append(row[0])
+                dates.append(row[1])
+                shares.append(int(row[2]))
+                prices.append(float(row[3]))
+        return cls(names, dates, shares, prices)
+
+    @classmethod
+    def from_holdings(cls, holdings):
+        holdings = list(holdings)
+        return cls([ h.name for h in holdings ], [ h.date for h in holdings ],
+                   [ h.shares for h in holdings ], [ h.price for h in holdings ])
+
+    def costs(self):
+        '''
+        Return the cost of every holding as a column
+        '''
+        if numpy is not None:
+            return self.shares * self.prices
+        return array('d', map(operator.mul, self.shares, self.prices))
+
+    def total_cost(self):
+        if numpy is not None:
+            return float(numpy.dot(self.shares, self.prices))
+        return sum(map(operator.mul, self.shares, self.prices))
+
+    def _names(self):
+        if self._index is None:
+            index = { }
+            for n, name in enumerate(self.names):
+                index.setdefault(name, []).append(n)
+            self._index = index
+        return self._index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, n):
+        if isinstance(n, str):
+            return [ HoldingView(self, i) for i in self._names().get(n, ()) ]
+        elif isinstance(n, slice):
+            return ColumnarPortfolio(self.names[n], self.dates[n], self.shares[n], self.prices[n])
+        else:
+            if n < 0:
+                n += len(self)
+            if not 0 <= n < len(self):
+                raise IndexError('ColumnarPortfolio index out of range')
+            return HoldingView(self, n)
+
+    def __iter__(self):
+        return (HoldingView(self, n) for n in range(len(self)))
+
+
+def read_portfolio(filename, holding=Holding):
     portfolio = []
     with open(filename, 'r') as f:
         rows = csv.reader(f)
         headers = next(rows)
         for row in rows:
-            h = Holding(row[0], row[1], int(row[2]), float(row[3]))
+            h = holding(row[0], row[1], int(row[2]), float(row[3]))
             portfolio.append(h)
     return portfolio
 
@@ -17,10 +17,17 @@ def follow(filename):
         yield line     # Emit a line
 
 import csv
+import sys
 
-def parse_stock_data(lines):
+def parse_stock_data(lines, *, intern=False):
+    '''
+    Convert lines of stock data.  If intern is true, the name, date and
+    time strings are interned so repeated values share one object.
+    '''
     rows = csv.reader(lines)
     types = [str, float, str, str, float, float, float, float, int]
+    if intern:
+        types[0] = types[2] = types[3] = sys.intern
     converted = ([func(val) for func, val in zip(types, row)]
                  for row in rows)
 
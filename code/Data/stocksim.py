@@ -12,6 +12,10 @@
 
 import math
 import time
+import io
+import gzip
+import bz2
+import lzma
 
 history_file = "dowstocks.csv"
 
@@ -35,10 +39,21 @@ def minutes_to_str(m):
     seconds = frac * 60
     return "%02d:%02d.%02.f" % (hours,minutes,seconds)
 
+# Open a file for reading text, decompressing gzip/bz2/xz files on the
+# fly.  The format is detected from the magic bytes at the start.
+def open_text(filename):
+    with open(filename, 'rb') as f:
+        head = f.read(6)
+    for magic, opener in [(b'\x1f\x8b', gzip.open), (b'BZh', bz2.open),
+                          (b'\xfd7zXZ\x00', lzma.open)]:
+        if head.startswith(magic):
+            return io.TextIOWrapper(io.BufferedReader(opener(filename, 'rb'), 1024*1024))
+    return open(filename)
+
 # Read the stock history file as a list of lists
 def read_history(filename):
     result = []
-    f = open(filename)
+    f = open_text(filename)
     next(f)
     for line in f:
         str_fields = line.strip().split(",")